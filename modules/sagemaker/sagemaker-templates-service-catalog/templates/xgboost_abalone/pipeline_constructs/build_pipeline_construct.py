@@ -189,6 +189,7 @@ class BuildPipelineConstruct(Construct):
                     "sagemaker:CreatePipeline",
                     "sagemaker:UpdatePipeline",
                     "sagemaker:DeletePipeline",
+                    "sagemaker:DescribePipeline",
                     "sagemaker:StartPipelineExecution",
                     "sagemaker:StopPipelineExecution",
                     "sagemaker:DescribePipelineExecution",
@@ -215,6 +216,14 @@ class BuildPipelineConstruct(Construct):
                 ],
             )
         )
+        codebuild_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "sagemaker:ListImages",
+                ],
+                resources=["*"],
+            )
+        )
 
         # Create the CodeBuild project
         sm_pipeline_build = codebuild.PipelineProject(
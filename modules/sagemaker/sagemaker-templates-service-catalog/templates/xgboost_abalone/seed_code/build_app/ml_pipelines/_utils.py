@@ -6,7 +6,9 @@
 from __future__ import absolute_import
 
 import ast
-from typing import Any, Dict, Optional
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
 
 
 def get_pipeline_driver(module_name: str, passed_args: Optional[str] = None) -> Any:
@@ -51,3 +53,99 @@ def get_pipeline_custom_tags(module_name: str, args: Optional[str], tags: Dict[s
     except Exception as e:
         print(f"Error getting project tags: {e}")
     return tags
+
+
+def get_pipeline_definition_digest(definition: str) -> str:
+    """Gets a digest of a pipeline definition that ignores JSON formatting
+
+    Args:
+        definition: the pipeline definition JSON
+
+    Returns:
+        SHA-256 hex digest of the normalized definition
+    """
+    normalized = json.dumps(json.loads(definition), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def get_pipeline_definition_args(pipeline: Any, definition: str) -> Dict[str, Any]:
+    """Gets the definition arguments of a create_pipeline or update_pipeline call
+
+    Like `Pipeline.upsert`, definitions over the 100 KB request limit are uploaded to the default
+    bucket and passed by their S3 location.
+
+    Args:
+        pipeline: the SageMaker Workflow pipeline
+        definition: the pipeline definition JSON
+
+    Returns:
+        PipelineDefinition or PipelineDefinitionS3Location keyword arguments
+    """
+    if len(definition.encode("utf-8")) < 1024 * 100:
+        return {"PipelineDefinition": definition}
+
+    from sagemaker import s3
+
+    bucket, object_key = s3.determine_bucket_and_prefix(
+        bucket=None, key_prefix=pipeline.name, sagemaker_session=pipeline.sagemaker_session
+    )
+    s3.S3Uploader.upload_string_as_file_body(
+        body=definition,
+        desired_s3_uri=s3.s3_path_join("s3://", bucket, object_key),
+        sagemaker_session=pipeline.sagemaker_session,
+    )
+    return {"PipelineDefinitionS3Location": {"Bucket": bucket, "ObjectKey": object_key}}
+
+
+def upsert_if_changed(
+    pipeline: Any,
+    definition: str,
+    role_arn: str,
+    description: Optional[str] = None,
+    tags: Optional[List[Dict[str, str]]] = None,
+) -> Any:
+    """Creates or updates the pipeline, unless the deployed pipeline is identical
+
+    The pipeline is left untouched when its deployed definition, role and description match the new
+    ones and it already has all the given tags, which saves the update call and keeps the deployed
+    pipeline version as is. Like `Pipeline.upsert`, tags are only added or overwritten, never removed.
+
+    Args:
+        pipeline: the SageMaker Workflow pipeline
+        definition: the pipeline definition JSON, as returned by `pipeline.definition()`
+        role_arn: the role arn for the pipeline service execution role
+        description: the description of the pipeline
+        tags: the tags to add to the pipeline
+
+    Returns:
+        The create or update response, or None if the pipeline is unchanged
+    """
+    sagemaker_client = pipeline.sagemaker_session.sagemaker_client
+    tags = tags or []
+    kwargs: Dict[str, Any] = dict(PipelineName=pipeline.name, RoleArn=role_arn)
+    if description is not None:
+        kwargs["PipelineDescription"] = description
+
+    try:
+        deployed = sagemaker_client.describe_pipeline(PipelineName=pipeline.name)
+    except sagemaker_client.exceptions.ResourceNotFound:
+        kwargs.update(get_pipeline_definition_args(pipeline, definition))
+        if tags:
+            kwargs["Tags"] = tags
+        return sagemaker_client.create_pipeline(**kwargs)
+
+    deployed_tags = sagemaker_client.list_tags(ResourceArn=deployed["PipelineArn"])["Tags"]
+    missing_tags = [tag for tag in tags if tag not in deployed_tags]
+    if (
+        deployed["RoleArn"] == role_arn
+        and deployed.get("PipelineDescription") == description
+        and get_pipeline_definition_digest(deployed["PipelineDefinition"]) == get_pipeline_definition_digest(definition)
+        and not missing_tags
+    ):
+        return None
+
+    kwargs.update(get_pipeline_definition_args(pipeline, definition))
+    response = sagemaker_client.update_pipeline(**kwargs)
+    if missing_tags:
+        sagemaker_client.add_tags(ResourceArn=deployed["PipelineArn"], Tags=missing_tags)
+    return response
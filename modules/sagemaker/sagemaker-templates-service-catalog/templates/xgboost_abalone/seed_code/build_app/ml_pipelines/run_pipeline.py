@@ -9,7 +9,7 @@ import argparse
 import json
 import sys
 
-from ml_pipelines._utils import convert_struct, get_pipeline_custom_tags, get_pipeline_driver
+from ml_pipelines._utils import convert_struct, get_pipeline_custom_tags, get_pipeline_driver, upsert_if_changed
 
 
 def main() -> None:  # pragma: no cover
@@ -65,18 +65,19 @@ def main() -> None:  # pragma: no cover
     try:
         pipeline = get_pipeline_driver(args.module_name, args.kwargs)
         print("###### Creating/updating a SageMaker Pipeline with the following definition:")
-        parsed = json.loads(pipeline.definition())
+        # built once, building the definition uploads the step code
+        definition = pipeline.definition()
+        parsed = json.loads(definition)
         print(json.dumps(parsed, indent=2, sort_keys=True))
 
         all_tags = get_pipeline_custom_tags(args.module_name, args.kwargs, tags)
 
-        upsert_response = pipeline.upsert(role_arn=args.role_arn, description=args.description, tags=all_tags)
-
-        upsert_response = pipeline.upsert(
-            role_arn=args.role_arn, description=args.description
-        )  # , tags=tags) # Removing tag momentaneously
-        print("\n###### Created/Updated SageMaker Pipeline: Response received:")
-        print(upsert_response)
+        upsert_response = upsert_if_changed(pipeline, definition, args.role_arn, args.description, all_tags)
+        if upsert_response is None:
+            print("\n###### SageMaker Pipeline is unchanged, skipping create/update")
+        else:
+            print("\n###### Created/Updated SageMaker Pipeline: Response received:")
+            print(upsert_response)
 
         execution = pipeline.start()
         print(f"\n###### Execution started with PipelineExecutionArn: {execution.arn}")
@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Set
 
 import sagemaker.session
 from botocore.exceptions import ClientError
@@ -81,3 +81,45 @@ def resolve_ecr_uri(sagemaker_session: sagemaker.session.Session, image_arn: str
         error_message = e.response["Error"]["Message"]
         logger.error(error_message)
         raise Exception(error_message)
+
+
+def list_image_names(sagemaker_session: sagemaker.session.Session, name_contains: str) -> Set[str]:
+    """Lists the SageMaker images whose name contains the given string
+
+    Args:
+        sagemaker_session: boto3 session for sagemaker client
+        name_contains: the string the image names must contain
+
+    Returns:
+        names of the matching images
+    """
+    image_names: Set[str] = set()
+    next_token = ""
+    while True:
+        response = sagemaker_session.sagemaker_client.list_images(
+            NameContains=name_contains,
+            MaxResults=100,
+            NextToken=next_token,
+        )
+        image_names.update(image["ImageName"] for image in response["Images"])
+
+        if "NextToken" in response:
+            next_token = response["NextToken"]
+        else:
+            return image_names
+
+
+def describe_latest_image_uri(sagemaker_session: sagemaker.session.Session, image_name: str) -> Optional[str]:
+    """Gets the ECR URI of the latest version of an image
+
+    Args:
+        sagemaker_session: boto3 session for sagemaker client
+        image_name: name of the image
+
+    Returns:
+        ECR URI of the latest image version, or None if the image has no version yet
+    """
+    try:
+        return str(sagemaker_session.sagemaker_client.describe_image_version(ImageName=image_name)["ContainerImage"])
+    except sagemaker_session.sagemaker_client.exceptions.ResourceNotFound:
+        return None
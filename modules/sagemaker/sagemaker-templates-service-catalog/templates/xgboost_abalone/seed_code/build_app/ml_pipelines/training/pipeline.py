@@ -3,62 +3,178 @@
 
 """Example workflow pipeline script for abalone pipeline.
 
-                                               . -RegisterModel
-                                              .
-    Process-> Train -> Evaluate -> Condition .
-                                              .
-                                               . -(stop)
+                                               . -RegisterModel <-.
+                                              .                    .
+    Process-> Train -> Evaluate -> Condition .                     .
+           .                                  .                    .
+            .                                  . -(stop)           .
+             . -> DataQualityBaseline .............................
+
+RegisterModel uses the baseline statistics and constraints as model metrics and drift check baselines.
 
 Implements a get_pipeline(**kwargs) method.
 """
 
+import hashlib
 import logging
-from typing import Any, Optional
-
-import boto3
-import sagemaker
-import sagemaker.session
-from sagemaker.estimator import Estimator
-from sagemaker.inputs import TrainingInput
-from sagemaker.model_metrics import MetricsSource, ModelMetrics
-from sagemaker.processing import ProcessingInput, ProcessingOutput, ScriptProcessor
-from sagemaker.workflow.condition_step import ConditionStep
-from sagemaker.workflow.conditions import ConditionLessThanOrEqualTo
-from sagemaker.workflow.functions import JsonGet
-from sagemaker.workflow.parameters import ParameterInteger, ParameterString
-from sagemaker.workflow.pipeline import Pipeline
-from sagemaker.workflow.properties import PropertyFile
-from sagemaker.workflow.step_collections import RegisterModel
-from sagemaker.workflow.steps import ProcessingStep, TrainingStep
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+# boto3 and the sagemaker SDK are slow to import, they are imported when a pipeline is built
+if TYPE_CHECKING:
+    import sagemaker.session
+    from sagemaker.workflow.pipeline_context import PipelineSession
 
 # BASE_DIR = os.path.dirname(os.path.realpath(__file__))
 
 logger = logging.getLogger(__name__)
 
+# sessions and image URIs are reused across get_pipeline calls
+_SESSION_CACHE: Dict[Tuple[str, Optional[str]], "PipelineSession"] = {}
+_IMAGE_URI_CACHE: Dict[Tuple[str, str], str] = {}
+
+# version of the built-in XGBoost image used in place of project images that are not built yet
+_FALLBACK_XGBOOST_VERSION = "1.0-1"
+
+# XGBoost hyperparameters of the abalone model
+_ABALONE_HYPERPARAMS: Dict[str, Any] = {
+    "objective": "reg:linear",
+    "num_round": 50,
+    "max_depth": 5,
+    "eta": 0.2,
+    "gamma": 4,
+    "min_child_weight": 6,
+    "subsample": 0.7,
+    "silent": 0,
+}
 
-def get_session(region: str, default_bucket: Optional[str]) -> sagemaker.session.Session:
-    """Gets the sagemaker session based on the region.
+
+def get_session(region: str, default_bucket: Optional[str]) -> "PipelineSession":
+    """Gets the sagemaker pipeline session based on the region.
+
+    A pipeline session defers job creation to pipeline execution and uploads step code
+    under a content hash, which keeps the pipeline definition stable between builds.
+    Sessions are cached per region and bucket.
 
     Args:
         region: the aws region to start the session
         default_bucket: the bucket to use for storing the artifacts
 
     Returns:
-        `sagemaker.session.Session instance
+        `sagemaker.workflow.pipeline_context.PipelineSession instance
     """
 
-    boto_session = boto3.Session(region_name=region)
+    import boto3
+    from sagemaker.workflow.pipeline_context import PipelineSession
+
+    key = (region, default_bucket)
+    if key not in _SESSION_CACHE:
+        boto_session = boto3.Session(region_name=region)
+
+        sagemaker_client = boto_session.client("sagemaker")
+        _SESSION_CACHE[key] = PipelineSession(
+            boto_session=boto_session,
+            sagemaker_client=sagemaker_client,
+            default_bucket=default_bucket,
+        )
+
+    return _SESSION_CACHE[key]
+
+
+@lru_cache(maxsize=None)
+def _retrieve_framework_image_uri(framework: str, region: str, version: str) -> str:
+    """Gets the URI of a SageMaker built-in framework image.
+
+    Args:
+        framework: name of the framework, e.g. xgboost
+        region: the aws region of the image
+        version: the framework version
+
+    Returns:
+        ECR URI of the framework image
+    """
+    from sagemaker import image_uris
 
-    sagemaker_client = boto_session.client("sagemaker")
-    runtime_client = boto_session.client("sagemaker-runtime")
-    session = sagemaker.session.Session(
-        boto_session=boto_session,
-        sagemaker_client=sagemaker_client,
-        sagemaker_runtime_client=runtime_client,
-        default_bucket=default_bucket,
+    return str(
+        image_uris.retrieve(
+            framework=framework,
+            region=region,
+            version=version,
+            py_version="py3",
+            instance_type="ml.m5.xlarge",
+        )
     )
 
-    return session
+
+def _file_digest(path: str) -> str:
+    """Gets a short digest of a file's content.
+
+    Args:
+        path: path of the file
+
+    Returns:
+        the first 16 hex digits of the SHA-256 digest of the file
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def _resolve_image_uri(
+    sagemaker_session: "sagemaker.session.Session", image_name: str, region: str, available_images: Set[str]
+) -> str:
+    """Gets the URI of a project image, falling back to the built-in XGBoost image.
+
+    Args:
+        sagemaker_session: the sagemaker session used to describe the image
+        image_name: name of the SageMaker image built by the project
+        region: the aws region of the image
+        available_images: names of the SageMaker images that exist in the account
+
+    Returns:
+        ECR URI of the latest image version, or of the built-in XGBoost image if not found
+    """
+    from ml_pipelines.training._utils import describe_latest_image_uri
+
+    if image_name in available_images:
+        # the image may exist without a version, if its first build has not finished yet
+        image_uri: Optional[str] = describe_latest_image_uri(sagemaker_session, image_name)
+        if image_uri is not None:
+            return image_uri
+    return _retrieve_framework_image_uri("xgboost", region, _FALLBACK_XGBOOST_VERSION)
+
+
+def _resolve_image_uris(
+    sagemaker_session: "sagemaker.session.Session", image_names: List[str], region: str, name_contains: str
+) -> List[str]:
+    """Gets the URIs of project images, falling back to the built-in XGBoost image.
+
+    Results are cached per region and image name. Images that are not cached yet are checked
+    against a single ListImages call, and only the existing ones are described, concurrently.
+
+    Args:
+        sagemaker_session: the sagemaker session used to look up the images
+        image_names: names of the SageMaker images built by the project
+        region: the aws region of the images
+        name_contains: a string all the project image names contain
+
+    Returns:
+        ECR URIs of the images, in the order of image_names
+    """
+    from ml_pipelines.training._utils import list_image_names
+
+    missing = [image_name for image_name in image_names if (region, image_name) not in _IMAGE_URI_CACHE]
+    if missing:
+        available_images = list_image_names(sagemaker_session, name_contains)
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            image_uris = executor.map(
+                lambda image_name: _resolve_image_uri(sagemaker_session, image_name, region, available_images),
+                missing,
+            )
+            for image_name, image_uri in zip(missing, image_uris):
+                _IMAGE_URI_CACHE[(region, image_name)] = image_uri
+
+    return [_IMAGE_URI_CACHE[(region, image_name)] for image_name in image_names]
 
 
 def get_pipeline(
@@ -70,6 +186,7 @@ def get_pipeline(
     pipeline_name: str = "AbalonePipeline",
     base_job_prefix: str = "Abalone",
     project_id: str = "SageMakerProjectId",
+    use_spot_instances: bool = True,
 ) -> Any:
     """Gets a SageMaker ML Pipeline instance working with on abalone data.
 
@@ -77,16 +194,38 @@ def get_pipeline(
         region: AWS region to create and run the pipeline.
         role: IAM role to create and run steps and pipeline.
         default_bucket: the bucket to use for storing the artifacts
+        use_spot_instances: whether to train on managed spot instances, resuming from checkpoints.
+            Spot training jobs are stopped after one hour of training.
 
     Returns:
         an instance of a pipeline
     """
 
+    from sagemaker.drift_check_baselines import DriftCheckBaselines
+    from sagemaker.estimator import Estimator
+    from sagemaker.inputs import TrainingInput
+    from sagemaker.model_metrics import MetricsSource, ModelMetrics
+    from sagemaker.model_monitor.dataset_format import DatasetFormat
+    from sagemaker.processing import ProcessingInput, ProcessingOutput, ScriptProcessor
+    from sagemaker.session import get_execution_role
+    from sagemaker.workflow.check_job_config import CheckJobConfig
+    from sagemaker.workflow.condition_step import ConditionStep
+    from sagemaker.workflow.conditions import ConditionLessThanOrEqualTo
+    from sagemaker.workflow.execution_variables import ExecutionVariables
+    from sagemaker.workflow.functions import Join, JsonGet
+    from sagemaker.workflow.parameters import ParameterFloat, ParameterInteger, ParameterString
+    from sagemaker.workflow.pipeline import Pipeline
+    from sagemaker.workflow.properties import PropertyFile
+    from sagemaker.workflow.quality_check_step import DataQualityCheckConfig, QualityCheckStep
+    from sagemaker.workflow.step_collections import RegisterModel
+    from sagemaker.workflow.steps import CacheConfig, ProcessingStep, TrainingStep
+
     sagemaker_session = get_session(region, default_bucket)
     if role is None:
-        role = sagemaker.session.get_execution_role(sagemaker_session)
+        role = get_execution_role(sagemaker_session)
 
     # parameters for pipeline execution
+    # preprocessing fits the scalers and splits the dataset over all rows, so its input is not sharded
     processing_instance_count = ParameterInteger(name="ProcessingInstanceCount", default_value=1)
     processing_instance_type = ParameterString(name="ProcessingInstanceType", default_value="ml.m5.xlarge")
     training_instance_type = ParameterString(name="TrainingInstanceType", default_value="ml.m5.xlarge")
@@ -96,60 +235,124 @@ def get_pipeline(
         name="InputDataUrl",
         default_value=f"s3://sagemaker-servicecatalog-seedcode-{region}/dataset/abalone-dataset.csv",
     )
-    processing_image_name = "sagemaker-{0}-processingimagebuild".format(project_id)
-    training_image_name = "sagemaker-{0}-trainingimagebuild".format(project_id)
-    inference_image_name = "sagemaker-{0}-inferenceimagebuild".format(project_id)
+    # tunable hyperparameters, sweeping them does not change the definition or invalidate cached steps
+    num_round = ParameterInteger(name="NumRound", default_value=_ABALONE_HYPERPARAMS["num_round"])
+    max_depth = ParameterInteger(name="MaxDepth", default_value=_ABALONE_HYPERPARAMS["max_depth"])
+    eta = ParameterFloat(name="Eta", default_value=_ABALONE_HYPERPARAMS["eta"])
+    processing_image_name = f"sagemaker-{project_id}-processingimagebuild"
+    training_image_name = f"sagemaker-{project_id}-trainingimagebuild"
+    inference_image_name = f"sagemaker-{project_id}-inferenceimagebuild"
+
+    processing_image_uri, training_image_uri, inference_image_uri = _resolve_image_uris(
+        sagemaker_session,
+        [processing_image_name, training_image_name, inference_image_name],
+        region,
+        name_contains=f"sagemaker-{project_id}-",
+    )
+
+    # prefix of the baseline, checkpoint and evaluation outputs
+    artifacts_uri = f"s3://{sagemaker_session.default_bucket()}/{base_job_prefix}"
+
+    # reuse step results across executions as long as the step arguments are unchanged
+    cache_config = CacheConfig(enable_caching=True, expire_after="P30D")
+
+    # settings shared by the preprocessing and evaluation processors
+    processor_kwargs: Dict[str, Any] = dict(
+        command=["python3"],
+        instance_type=processing_instance_type,
+        sagemaker_session=sagemaker_session,
+        role=role,
+        output_kms_key=bucket_kms_id,
+    )
 
     # processing step for feature engineering
-    try:
-        processing_image_uri = sagemaker_session.sagemaker_client.describe_image_version(
-            ImageName=processing_image_name
-        )["ContainerImage"]
-    except sagemaker_session.sagemaker_client.exceptions.ResourceNotFound:
-        processing_image_uri = sagemaker.image_uris.retrieve(
-            framework="xgboost",
-            region=region,
-            version="1.0-1",
-            py_version="py3",
-            instance_type="ml.m5.xlarge",
-        )
     script_processor = ScriptProcessor(
         image_uri=processing_image_uri,
-        instance_type=processing_instance_type,
         instance_count=processing_instance_count,
         base_job_name=f"{base_job_prefix}/sklearn-abalone-preprocess",
-        command=["python3"],
-        sagemaker_session=sagemaker_session,
-        role=role,
-        output_kms_key=bucket_kms_id,
+        **processor_kwargs,
     )
     step_process = ProcessingStep(
         name="PreprocessAbaloneData",
-        processor=script_processor,
-        outputs=[
-            ProcessingOutput(output_name="train", source="/opt/ml/processing/train"),
-            ProcessingOutput(output_name="validation", source="/opt/ml/processing/validation"),
-            ProcessingOutput(output_name="test", source="/opt/ml/processing/test"),
-        ],
-        code="source_scripts/preprocessing/prepare_abalone_data/main.py",
-        job_arguments=["--input-data", input_data],
+        step_args=script_processor.run(
+            inputs=[
+                ProcessingInput(
+                    source=input_data,
+                    destination="/opt/ml/processing/input/data",
+                    s3_data_distribution_type="FullyReplicated",
+                    s3_input_mode="File",
+                ),
+            ],
+            outputs=[
+                ProcessingOutput(output_name="train", source="/opt/ml/processing/train"),
+                ProcessingOutput(output_name="validation", source="/opt/ml/processing/validation"),
+                ProcessingOutput(output_name="test", source="/opt/ml/processing/test"),
+                ProcessingOutput(output_name="baseline", source="/opt/ml/processing/baseline"),
+            ],
+            code="source_scripts/preprocessing/prepare_abalone_data/main.py",
+        ),
+        cache_config=cache_config,
+    )
+    process_outputs = step_process.properties.ProcessingOutputConfig.Outputs
+    train_data_uri = process_outputs["train"].S3Output.S3Uri
+    validation_data_uri = process_outputs["validation"].S3Output.S3Uri
+    test_data_uri = process_outputs["test"].S3Output.S3Uri
+    baseline_data_uri = process_outputs["baseline"].S3Output.S3Uri
+
+    # data quality baseline step, it only needs the preprocessed features and runs alongside training
+    step_baseline = QualityCheckStep(
+        name="DataQualityBaselineAbalone",
+        quality_check_config=DataQualityCheckConfig(
+            baseline_dataset=baseline_data_uri,
+            dataset_format=DatasetFormat.csv(header=False),
+            output_s3_uri=Join(
+                on="/",
+                values=[
+                    artifacts_uri,
+                    "baseline",
+                    ExecutionVariables.PIPELINE_EXECUTION_ID,
+                ],
+            ),
+        ),
+        check_job_config=CheckJobConfig(
+            role=role,
+            instance_count=1,
+            instance_type=processing_instance_type,
+            output_kms_key=bucket_kms_id,
+            base_job_name=f"{base_job_prefix}/abalone-data-baseline",
+            sagemaker_session=sagemaker_session,
+        ),
+        skip_check=True,
+        register_new_baseline=True,
+        model_package_group_name=model_package_group_name,
+        cache_config=cache_config,
     )
 
     # training step for generating model artifacts
-    model_path = f"s3://{default_bucket}/{base_job_prefix}/AbaloneTrain"
-
-    try:
-        training_image_uri = sagemaker_session.sagemaker_client.describe_image_version(ImageName=training_image_name)[
-            "ContainerImage"
-        ]
-    except sagemaker_session.sagemaker_client.exceptions.ResourceNotFound:
-        training_image_uri = sagemaker.image_uris.retrieve(
-            framework="xgboost",
-            region=region,
-            version="1.0-1",
-            py_version="py3",
-            instance_type="ml.m5.xlarge",
+    model_path = f"{artifacts_uri}/AbaloneTrain"
+    # spot jobs are capped to one hour of training and one more hour of waiting for capacity.
+    # checkpoints are keyed on the preprocessing job and the tunable hyperparameters, which keeps the training
+    # step cacheable, while a job never resumes from a model trained on other data or settings
+    spot_kwargs: Dict[str, Any] = (
+        dict(
+            use_spot_instances=True,
+            max_run=3600,
+            max_wait=7200,
+            checkpoint_s3_uri=Join(
+                on="/",
+                values=[
+                    model_path,
+                    "checkpoints",
+                    step_process.properties.ProcessingJobName,
+                    num_round,
+                    max_depth,
+                    eta,
+                ],
+            ),
         )
+        if use_spot_instances
+        else {}
+    )
 
     xgb_train = Estimator(
         image_uri=training_image_uri,
@@ -160,42 +363,41 @@ def get_pipeline(
         sagemaker_session=sagemaker_session,
         role=role,
         output_kms_key=bucket_kms_id,
+        **spot_kwargs,
     )
     xgb_train.set_hyperparameters(
-        objective="reg:linear",
-        num_round=50,
-        max_depth=5,
-        eta=0.2,
-        gamma=4,
-        min_child_weight=6,
-        subsample=0.7,
-        silent=0,
+        **{**_ABALONE_HYPERPARAMS, "num_round": num_round, "max_depth": max_depth, "eta": eta}
     )
+    # FastFile streams the datasets from S3 on read, instead of downloading them before training starts.
+    # the built-in XGBoost fallback image only accepts File and Pipe channels, so it keeps File
+    fallback_image_uri = _retrieve_framework_image_uri("xgboost", region, _FALLBACK_XGBOOST_VERSION)
+    training_input_mode = "File" if training_image_uri == fallback_image_uri else "FastFile"
     step_train = TrainingStep(
         name="TrainAbaloneModel",
-        estimator=xgb_train,
-        inputs={
-            "train": TrainingInput(
-                s3_data=step_process.properties.ProcessingOutputConfig.Outputs["train"].S3Output.S3Uri,
-                content_type="text/csv",
-            ),
-            "validation": TrainingInput(
-                s3_data=step_process.properties.ProcessingOutputConfig.Outputs["validation"].S3Output.S3Uri,
-                content_type="text/csv",
-            ),
-        },
+        step_args=xgb_train.fit(
+            inputs={
+                "train": TrainingInput(
+                    s3_data=train_data_uri,
+                    content_type="text/csv",
+                    input_mode=training_input_mode,
+                ),
+                "validation": TrainingInput(
+                    s3_data=validation_data_uri,
+                    content_type="text/csv",
+                    input_mode=training_input_mode,
+                ),
+            },
+        ),
+        cache_config=cache_config,
     )
 
     # processing step for evaluation
+    evaluation_code = "source_scripts/evaluate/evaluate_xgboost/main.py"
     script_eval = ScriptProcessor(
         image_uri=training_image_uri,
-        command=["python3"],
-        instance_type=processing_instance_type,
         instance_count=1,
         base_job_name=f"{base_job_prefix}/script-abalone-eval",
-        sagemaker_session=sagemaker_session,
-        role=role,
-        output_kms_key=bucket_kms_id,
+        **processor_kwargs,
     )
     evaluation_report = PropertyFile(
         name="AbaloneEvaluationReport",
@@ -204,46 +406,72 @@ def get_pipeline(
     )
     step_eval = ProcessingStep(
         name="EvaluateAbaloneModel",
-        processor=script_eval,
-        inputs=[
-            ProcessingInput(
-                source=step_train.properties.ModelArtifacts.S3ModelArtifacts,
-                destination="/opt/ml/processing/model",
-            ),
-            ProcessingInput(
-                source=step_process.properties.ProcessingOutputConfig.Outputs["test"].S3Output.S3Uri,
-                destination="/opt/ml/processing/test",
-            ),
-        ],
-        outputs=[
-            ProcessingOutput(output_name="evaluation", source="/opt/ml/processing/evaluation"),
-        ],
-        code="source_scripts/evaluate/evaluate_xgboost/main.py",
+        step_args=script_eval.run(
+            inputs=[
+                ProcessingInput(
+                    source=step_train.properties.ModelArtifacts.S3ModelArtifacts,
+                    destination="/opt/ml/processing/model",
+                ),
+                ProcessingInput(
+                    source=test_data_uri,
+                    destination="/opt/ml/processing/test",
+                ),
+            ],
+            outputs=[
+                # one report per model and evaluation code, the location is stable, so the step stays cacheable,
+                # and re-evaluating a model with changed code never overwrites the report of a registered package
+                ProcessingOutput(
+                    output_name="evaluation",
+                    source="/opt/ml/processing/evaluation",
+                    destination=Join(
+                        on="/",
+                        values=[
+                            artifacts_uri,
+                            "evaluation",
+                            step_train.properties.TrainingJobName,
+                            _file_digest(evaluation_code),
+                        ],
+                    ),
+                ),
+            ],
+            code=evaluation_code,
+        ),
         property_files=[evaluation_report],
+        cache_config=cache_config,
     )
 
     # register model step that will be conditionally executed
+    # the report location is resolved at execution time, so it also points at reused (cached) evaluation outputs
     model_metrics = ModelMetrics(
         model_statistics=MetricsSource(
-            s3_uri="{}/evaluation.json".format(
-                step_eval.arguments["ProcessingOutputConfig"]["Outputs"][0]["S3Output"]["S3Uri"]
+            s3_uri=Join(
+                on="/",
+                values=[
+                    step_eval.properties.ProcessingOutputConfig.Outputs["evaluation"].S3Output.S3Uri,
+                    "evaluation.json",
+                ],
             ),
             content_type="application/json",
-        )
+        ),
+        model_data_statistics=MetricsSource(
+            s3_uri=step_baseline.properties.CalculatedBaselineStatistics,
+            content_type="application/json",
+        ),
+        model_data_constraints=MetricsSource(
+            s3_uri=step_baseline.properties.CalculatedBaselineConstraints,
+            content_type="application/json",
+        ),
+    )
+    drift_check_baselines = DriftCheckBaselines(
+        model_data_statistics=MetricsSource(
+            s3_uri=step_baseline.properties.BaselineUsedForDriftCheckStatistics,
+            content_type="application/json",
+        ),
+        model_data_constraints=MetricsSource(
+            s3_uri=step_baseline.properties.BaselineUsedForDriftCheckConstraints,
+            content_type="application/json",
+        ),
     )
-
-    try:
-        inference_image_uri = sagemaker_session.sagemaker_client.describe_image_version(ImageName=inference_image_name)[
-            "ContainerImage"
-        ]
-    except sagemaker_session.sagemaker_client.exceptions.ResourceNotFound:
-        inference_image_uri = sagemaker.image_uris.retrieve(
-            framework="xgboost",
-            region=region,
-            version="1.0-1",
-            py_version="py3",
-            instance_type="ml.m5.xlarge",
-        )
     step_register = RegisterModel(
         name="RegisterAbaloneModel",
         estimator=xgb_train,
@@ -256,6 +484,7 @@ def get_pipeline(
         model_package_group_name=model_package_group_name,
         approval_status=model_approval_status,
         model_metrics=model_metrics,
+        drift_check_baselines=drift_check_baselines,
     )
 
     # condition step for evaluating model quality and branching execution
@@ -283,8 +512,11 @@ def get_pipeline(
             training_instance_type,
             model_approval_status,
             input_data,
+            num_round,
+            max_depth,
+            eta,
         ],
-        steps=[step_process, step_train, step_eval, step_cond],
+        steps=[step_process, step_baseline, step_train, step_eval, step_cond],
         sagemaker_session=sagemaker_session,
     )
     return pipeline
@@ -58,28 +58,44 @@ def merge_two_dicts(x: Dict[str, Any], y: Dict[str, Any]) -> Dict[str, Any]:
 if __name__ == "__main__":
     logger.debug("Starting preprocessing.")
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input-data", type=str, required=True)
+    # without --input-data, the dataset is read from the processing job input
+    parser.add_argument("--input-data", type=str, required=False)
     args = parser.parse_args()
 
     base_dir = "/opt/ml/processing"
-    pathlib.Path(f"{base_dir}/data").mkdir(parents=True, exist_ok=True)
-    input_data = args.input_data
-    bucket = input_data.split("/")[2]
-    key = "/".join(input_data.split("/")[3:])
-
-    logger.info("Downloading data from bucket: %s, key: %s", bucket, key)
-    fn = f"{base_dir}/data/abalone-dataset.csv"
-    s3 = boto3.resource("s3")
-    s3.Bucket(bucket).download_file(key, fn)
-
-    logger.debug("Reading downloaded data.")
-    df = pd.read_csv(
-        fn,
-        header=None,
-        names=feature_columns_names + [label_column],
-        dtype=merge_two_dicts(feature_columns_dtype, label_column_dtype),
+    if args.input_data:
+        pathlib.Path(f"{base_dir}/data").mkdir(parents=True, exist_ok=True)
+        input_data = args.input_data
+        bucket = input_data.split("/")[2]
+        key = "/".join(input_data.split("/")[3:])
+
+        logger.info("Downloading data from bucket: %s, key: %s", bucket, key)
+        fn = f"{base_dir}/data/abalone-dataset.csv"
+        s3 = boto3.resource("s3")
+        s3.Bucket(bucket).download_file(key, fn)
+        input_files = [fn]
+    else:
+        # the input may be a prefix with subfolders, all the files below it are read
+        input_dir = f"{base_dir}/input/data"
+        input_files = sorted(str(path) for path in pathlib.Path(input_dir).rglob("*") if path.is_file())
+        if not input_files:
+            raise ValueError(f"No input files found in {input_dir}")
+
+    logger.debug("Reading input data from %s.", input_files)
+    df = pd.concat(
+        [
+            pd.read_csv(
+                input_file,
+                header=None,
+                names=feature_columns_names + [label_column],
+                dtype=merge_two_dicts(feature_columns_dtype, label_column_dtype),
+            )
+            for input_file in input_files
+        ],
+        ignore_index=True,
     )
-    os.unlink(fn)
+    if args.input_data:
+        os.unlink(input_files[0])
 
     logger.debug("Defining transformers.")
     numeric_features = list(feature_columns_names)
@@ -121,3 +137,5 @@ if __name__ == "__main__":
     pd.DataFrame(train).to_csv(f"{base_dir}/train/train.csv", header=False, index=False)
     pd.DataFrame(validation).to_csv(f"{base_dir}/validation/validation.csv", header=False, index=False)
     pd.DataFrame(test).to_csv(f"{base_dir}/test/test.csv", header=False, index=False)
+    # the data quality baseline describes the model inputs, so it excludes the label column
+    pd.DataFrame(train[:, 1:]).to_csv(f"{base_dir}/baseline/baseline.csv", header=False, index=False)
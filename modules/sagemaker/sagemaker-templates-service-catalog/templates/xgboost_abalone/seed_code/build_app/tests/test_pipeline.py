@@ -0,0 +1,104 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+from unittest import mock
+
+import pytest
+from ml_pipelines.training import pipeline as abalone_pipeline
+from ml_pipelines.training._utils import list_image_names
+
+REGION = "us-east-1"
+FALLBACK_IMAGE_URI = "111111111111.dkr.ecr.us-east-1.amazonaws.com/sagemaker-xgboost:1.0-1-cpu-py3"
+PROCESSING_IMAGE = "sagemaker-pid-processingimagebuild"
+TRAINING_IMAGE = "sagemaker-pid-trainingimagebuild"
+INFERENCE_IMAGE = "sagemaker-pid-inferenceimagebuild"
+
+
+class ResourceNotFound(Exception):
+    pass
+
+
+@pytest.fixture(scope="function")
+def sagemaker_session():
+    sagemaker_session = mock.Mock()
+    sagemaker_client = sagemaker_session.sagemaker_client
+    sagemaker_client.exceptions.ResourceNotFound = ResourceNotFound
+    sagemaker_client.list_images.return_value = {
+        "Images": [{"ImageName": PROCESSING_IMAGE}, {"ImageName": TRAINING_IMAGE}]
+    }
+
+    def describe_image_version(ImageName):
+        if ImageName == PROCESSING_IMAGE:
+            # the image exists, but its first version has not been created yet
+            raise ResourceNotFound()
+        return {"ContainerImage": f"111111111111.dkr.ecr.us-east-1.amazonaws.com/{ImageName}:1"}
+
+    sagemaker_client.describe_image_version.side_effect = describe_image_version
+    return sagemaker_session
+
+
+@pytest.fixture(autouse=True)
+def image_uri_cache():
+    with mock.patch.dict(abalone_pipeline._IMAGE_URI_CACHE, clear=True), mock.patch.object(
+        abalone_pipeline, "_retrieve_framework_image_uri", return_value=FALLBACK_IMAGE_URI
+    ):
+        yield abalone_pipeline._IMAGE_URI_CACHE
+
+
+def resolve_image_uris(sagemaker_session):
+    return abalone_pipeline._resolve_image_uris(
+        sagemaker_session, [PROCESSING_IMAGE, TRAINING_IMAGE, INFERENCE_IMAGE], REGION, name_contains="sagemaker-pid-"
+    )
+
+
+def test_list_image_names_follows_pagination(sagemaker_session):
+    sagemaker_client = sagemaker_session.sagemaker_client
+    sagemaker_client.list_images.side_effect = [
+        {"Images": [{"ImageName": PROCESSING_IMAGE}], "NextToken": "page-2"},
+        {"Images": [{"ImageName": TRAINING_IMAGE}]},
+    ]
+
+    assert list_image_names(sagemaker_session, "sagemaker-pid-") == {PROCESSING_IMAGE, TRAINING_IMAGE}
+    assert sagemaker_client.list_images.call_args_list == [
+        mock.call(NameContains="sagemaker-pid-", MaxResults=100, NextToken=""),
+        mock.call(NameContains="sagemaker-pid-", MaxResults=100, NextToken="page-2"),
+    ]
+
+
+def test_resolves_images_with_a_single_list_call(sagemaker_session):
+    sagemaker_client = sagemaker_session.sagemaker_client
+
+    assert resolve_image_uris(sagemaker_session) == [
+        # listed, but without a version
+        FALLBACK_IMAGE_URI,
+        f"111111111111.dkr.ecr.us-east-1.amazonaws.com/{TRAINING_IMAGE}:1",
+        # not listed
+        FALLBACK_IMAGE_URI,
+    ]
+    sagemaker_client.list_images.assert_called_once()
+    # the image that is not listed is never described
+    assert sorted(call.kwargs["ImageName"] for call in sagemaker_client.describe_image_version.call_args_list) == [
+        PROCESSING_IMAGE,
+        TRAINING_IMAGE,
+    ]
+
+
+def test_warm_cache_makes_no_api_calls(sagemaker_session):
+    sagemaker_client = sagemaker_session.sagemaker_client
+    image_uris = resolve_image_uris(sagemaker_session)
+    sagemaker_client.reset_mock()
+
+    assert resolve_image_uris(sagemaker_session) == image_uris
+    sagemaker_client.list_images.assert_not_called()
+    sagemaker_client.describe_image_version.assert_not_called()
+
+
+def test_cache_is_keyed_on_region(sagemaker_session, image_uri_cache):
+    resolve_image_uris(sagemaker_session)
+
+    abalone_pipeline._resolve_image_uris(
+        sagemaker_session, [TRAINING_IMAGE], "eu-west-1", name_contains="sagemaker-pid-"
+    )
+
+    assert sagemaker_session.sagemaker_client.list_images.call_count == 2
+    assert ("eu-west-1", TRAINING_IMAGE) in image_uri_cache
@@ -0,0 +1,114 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+from unittest import mock
+
+import pytest
+from ml_pipelines._utils import upsert_if_changed
+
+ROLE_ARN = "arn:aws:iam::111111111111:role/pipeline-role"
+PIPELINE_ARN = "arn:aws:sagemaker:us-east-1:111111111111:pipeline/abalone"
+DEFINITION = json.dumps({"Version": "2020-12-01", "Steps": [{"Name": "Train"}]})
+TAGS = [{"Key": "sagemaker:project-name", "Value": "abalone"}]
+
+
+class ResourceNotFound(Exception):
+    pass
+
+
+@pytest.fixture(scope="function")
+def pipeline():
+    pipeline = mock.Mock()
+    pipeline.name = "abalone"
+    sagemaker_client = pipeline.sagemaker_session.sagemaker_client
+    sagemaker_client.exceptions.ResourceNotFound = ResourceNotFound
+    sagemaker_client.describe_pipeline.return_value = {
+        "PipelineArn": PIPELINE_ARN,
+        # same definition, formatted differently
+        "PipelineDefinition": json.dumps(json.loads(DEFINITION), indent=2),
+        "RoleArn": ROLE_ARN,
+        "PipelineDescription": "abalone pipeline",
+    }
+    sagemaker_client.list_tags.return_value = {"Tags": TAGS}
+    return pipeline
+
+
+def test_creates_missing_pipeline(pipeline):
+    sagemaker_client = pipeline.sagemaker_session.sagemaker_client
+    sagemaker_client.describe_pipeline.side_effect = ResourceNotFound()
+
+    response = upsert_if_changed(pipeline, DEFINITION, ROLE_ARN, "abalone pipeline", TAGS)
+
+    assert response == sagemaker_client.create_pipeline.return_value
+    sagemaker_client.create_pipeline.assert_called_once_with(
+        PipelineName="abalone",
+        PipelineDefinition=DEFINITION,
+        RoleArn=ROLE_ARN,
+        PipelineDescription="abalone pipeline",
+        Tags=TAGS,
+    )
+    sagemaker_client.update_pipeline.assert_not_called()
+
+
+def test_skips_unchanged_pipeline(pipeline):
+    sagemaker_client = pipeline.sagemaker_session.sagemaker_client
+
+    assert upsert_if_changed(pipeline, DEFINITION, ROLE_ARN, "abalone pipeline", TAGS) is None
+    sagemaker_client.create_pipeline.assert_not_called()
+    sagemaker_client.update_pipeline.assert_not_called()
+    sagemaker_client.add_tags.assert_not_called()
+    pipeline.definition.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "definition,role_arn,description",
+    [
+        (json.dumps({"Version": "2020-12-01", "Steps": [{"Name": "Evaluate"}]}), ROLE_ARN, "abalone pipeline"),
+        (DEFINITION, "arn:aws:iam::111111111111:role/other-role", "abalone pipeline"),
+        (DEFINITION, ROLE_ARN, "new description"),
+    ],
+)
+def test_updates_changed_pipeline(pipeline, definition, role_arn, description):
+    sagemaker_client = pipeline.sagemaker_session.sagemaker_client
+
+    response = upsert_if_changed(pipeline, definition, role_arn, description, TAGS)
+
+    assert response == sagemaker_client.update_pipeline.return_value
+    sagemaker_client.update_pipeline.assert_called_once_with(
+        PipelineName="abalone",
+        PipelineDefinition=definition,
+        RoleArn=role_arn,
+        PipelineDescription=description,
+    )
+    sagemaker_client.add_tags.assert_not_called()
+
+
+def test_adds_new_tags_to_unchanged_pipeline(pipeline):
+    sagemaker_client = pipeline.sagemaker_session.sagemaker_client
+    new_tag = {"Key": "team", "Value": "mlops"}
+
+    upsert_if_changed(pipeline, DEFINITION, ROLE_ARN, "abalone pipeline", TAGS + [new_tag])
+
+    sagemaker_client.update_pipeline.assert_called_once()
+    sagemaker_client.add_tags.assert_called_once_with(ResourceArn=PIPELINE_ARN, Tags=[new_tag])
+
+
+def test_uploads_large_definition_to_s3(pipeline):
+    sagemaker_client = pipeline.sagemaker_session.sagemaker_client
+    sagemaker_client.describe_pipeline.side_effect = ResourceNotFound()
+    definition = json.dumps({"Version": "2020-12-01", "Steps": [{"Name": "Train", "Padding": "x" * 1024 * 100}]})
+
+    with mock.patch("sagemaker.s3.determine_bucket_and_prefix", return_value=("bucket", "abalone")), mock.patch(
+        "sagemaker.s3.S3Uploader.upload_string_as_file_body"
+    ) as upload:
+        upsert_if_changed(pipeline, definition, ROLE_ARN)
+
+    upload.assert_called_once_with(
+        body=definition, desired_s3_uri="s3://bucket/abalone", sagemaker_session=pipeline.sagemaker_session
+    )
+    sagemaker_client.create_pipeline.assert_called_once_with(
+        PipelineName="abalone",
+        RoleArn=ROLE_ARN,
+        PipelineDefinitionS3Location={"Bucket": "bucket", "ObjectKey": "abalone"},
+    )